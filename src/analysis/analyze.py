@@ -1,60 +1,268 @@
-"""Analyze syllabi using the Claude API."""
+"""Analyze syllabi using the Claude API.
+
+Usage: python -m src.analysis.analyze [--batch] [DEPT ...]
+
+Results are written to data/results/DEPT.json, for every department unless
+some are named. Syllabi already listed there are skipped: delete an entry
+(e.g. an `_error` one) to retry that syllabus, or the whole file to
+re-analyze the department. An interrupted run's new results are kept in
+DEPT.jsonl and merged into the JSON file by the next run. With --batch the
+Message Batches API is used, and batches an interrupted run submitted are
+collected by the next --batch run.
+"""
 
 import anthropic
+import asyncio
 import base64
-import json
+import functools
+import httpx
+import logging
+import mmap
+import os
+import random
 import re
 import sys
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from itertools import chain
 from pathlib import Path
+from typing import BinaryIO, Callable, Iterable, TextIO
 
-import docx
+import orjson
 from dotenv import load_dotenv
+from lxml import etree
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pydantic import TypeAdapter
 
 load_dotenv()
 
 from .models import SyllabusReview
 
+logger = logging.getLogger(__name__)
+
+
+def _configure_logging() -> None:
+    """Log this module's messages to stderr at LOG_LEVEL (default INFO).
+
+    Called by every public entry point, not only the CLI, so importing the module
+    and calling them still reports progress. It does nothing if a handler is
+    already attached.
+    """
+    if not logger.handlers:
+        handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+
+
+# Built once so each reply is validated by the same compiled validator
+_REVIEW_ADAPTER = TypeAdapter(SyllabusReview)
+
 PROMPT_PATH = Path(__file__).parent / "prompt.txt"
 SYLLABI_DIR = Path(__file__).parents[2] / "syllabi"
 RESULTS_DIR = Path(__file__).parents[2] / "data" / "results"
+CATALOG_FILE = Path(__file__).parents[2] / "data" / "results.parquet"
 PROGRAMS_FILE = Path(__file__).parents[2] / "data" / "programs.json"
 EXCLUDED_COURSES_FILE = Path(__file__).parents[2] / "data" / "excluded_courses.json"
+BATCH_STATE_FILE = Path(__file__).parents[2] / "data" / "pending_batches.json"
+
+# Maximum number of Claude requests in flight at once
+MAX_CONCURRENCY = int(os.getenv("ANTHROPIC_MAX_CONCURRENCY", "5"))
+
+# Account rate limits shared by all in-flight requests (defaults match the entry API tier)
+REQUESTS_PER_MINUTE = int(os.getenv("ANTHROPIC_REQUESTS_PER_MINUTE", "50"))
+INPUT_TOKENS_PER_MINUTE = int(os.getenv("ANTHROPIC_INPUT_TOKENS_PER_MINUTE", "30000"))
+MAX_RETRIES = int(os.getenv("ANTHROPIC_MAX_RETRIES", "6"))
+
+# Log a progress line every this many analyzed files instead of one line per file
+_PROGRESS_EVERY = 25
+
+# Transient API statuses retried by AnthropicGovernor; the shared client's own retries are disabled
+_RETRYABLE_STATUSES = {408, 409, 429, 500, 502, 503, 504, 529}
+
+MODEL = "claude-sonnet-4-5-20250929"
+MAX_TOKENS = 4096
+
+# Message Batches API limits: requests per batch and total request size (kept under the 256 MB cap)
+_BATCH_MAX_REQUESTS = 10_000
+_BATCH_MAX_BYTES = 200 * 1024 * 1024
+_BATCH_POLL_SECONDS = 60
+
+
+_SYSTEM_PROMPT = PROMPT_PATH.read_text(encoding="utf-8")
 
 
 def load_system_prompt() -> str:
-    return PROMPT_PATH.read_text(encoding="utf-8")
+    return _SYSTEM_PROMPT
+
+
+# The system prompt is identical for every request, so mark it for Anthropic's prompt cache
+_SYSTEM_BLOCKS = [
+    {
+        "type": "text",
+        "text": _SYSTEM_PROMPT,
+        "cache_control": {"type": "ephemeral"},
+    }
+]
 
 
 SUPPORTED_EXTENSIONS = {".pdf", ".docx"}
+_SUPPORTED_SUFFIXES = tuple(SUPPORTED_EXTENSIONS)
 
 
-_DEPT_RE = re.compile(r"^([A-Z]+)\d")
+_CODE_RE = re.compile(r"^([A-Z]+)(\d*)")
+
+
+def _parse_code(code: str) -> tuple[str | None, str | None]:
+    """Split the leading department letters and course number off a code (e.g. 'POL10100' -> ('POL', '10100')).
+
+    The number is '' if no digits follow the letters; both parts are None if
+    the code does not start with a capital letter.
+    """
+    m = _CODE_RE.match(code)
+    return (m[1], m[2]) if m else (None, None)
 
 
 def _extract_department(filename: str) -> str | None:
     """Extract the department code from a syllabus filename (e.g. 'POL10100_Spring2026_X.pdf' -> 'POL')."""
-    m = _DEPT_RE.match(filename)
-    return m.group(1) if m else None
+    dept, num = _parse_code(filename)
+    return dept if num else None
+
+
+@functools.lru_cache(maxsize=1)
+def _scan_syllabi() -> list[tuple[str, str | None, Path]]:
+    """Scan the syllabi directory once and return sorted (course code, department, path) entries.
+
+    The course code is the filename prefix before the first underscore
+    (e.g. 'POL10100_Spring2026_X.pdf' -> 'POL10100').
+    """
+    entries = []
+    with os.scandir(SYLLABI_DIR) as it:
+        for entry in it:
+            # Check the name before allocating a Path for entries that are not syllabi
+            name = entry.name
+            lower = name.lower()
+            if lower.endswith(_SUPPORTED_SUFFIXES) and lower not in SUPPORTED_EXTENSIONS:
+                code = name.rsplit(".", 1)[0].split("_", 1)[0].upper()
+                entries.append((code, _extract_department(name), Path(entry.path)))
+    entries.sort(key=lambda e: e[2])
+    return entries
+
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+
+# Text of the run children rendered as fixed characters; w:br depends on its type
+_DOCX_RUN_CHARS = {f"{_W}tab": "\t", f"{_W}ptab": "\t", f"{_W}cr": "\n", f"{_W}noBreakHyphen": "-"}
+
+
+def _docx_run_text(run: etree._Element) -> str:
+    """Return the text of a <w:r> element as python-docx renders it.
+
+    Only the run's own children count, so content nested in drawings or text
+    boxes is skipped. Line breaks become newlines; page and column breaks
+    become nothing.
+    """
+    parts = []
+    for el in run:
+        if el.tag == f"{_W}t":
+            parts.append(el.text or "")
+        elif el.tag == f"{_W}br":
+            if el.get(f"{_W}type", "textWrapping") == "textWrapping":
+                parts.append("\n")
+        elif (char := _DOCX_RUN_CHARS.get(el.tag)) is not None:
+            parts.append(char)
+    return "".join(parts)
+
+
+def _docx_paragraph_text(paragraph: etree._Element) -> str:
+    """Return the text of a <w:p> element, matching python-docx's Paragraph.text.
+
+    That is the text of the paragraph's direct runs and of the runs in its hyperlinks.
+    """
+    parts = []
+    for child in paragraph:
+        if child.tag == f"{_W}r":
+            parts.append(_docx_run_text(child))
+        elif child.tag == f"{_W}hyperlink":
+            parts.extend(_docx_run_text(run) for run in child.iterfind(f"{_W}r"))
+    return "".join(parts)
 
 
 def _extract_docx_text(docx_path: Path) -> str:
-    """Extract plain text from a DOCX file."""
-    doc = docx.Document(str(docx_path))
-    paragraphs = [p.text for p in doc.paragraphs if p.text.strip()]
-    for table in doc.tables:
-        for row in table.rows:
-            cells = [cell.text.strip() for cell in row.cells if cell.text.strip()]
+    """Extract plain text from a DOCX file.
+
+    Parses word/document.xml directly: body paragraphs first, then one
+    " | "-joined line per table row. Unlike python-docx, a merged cell is
+    listed once rather than once per grid column it spans.
+    """
+    with zipfile.ZipFile(docx_path) as z, z.open("word/document.xml") as f:
+        body = etree.parse(f).getroot().find(f"{_W}body")
+    paragraphs = [text for p in body.iterfind(f"{_W}p") if (text := _docx_paragraph_text(p)).strip()]
+    for table in body.iterfind(f"{_W}tbl"):
+        for row in table.iterfind(f"{_W}tr"):
+            cells = [
+                text
+                for cell in row.iterfind(f"{_W}tc")
+                if (text := "\n".join(_docx_paragraph_text(p) for p in cell.iterfind(f"{_W}p")).strip())
+            ]
             if cells:
                 paragraphs.append(" | ".join(cells))
     return "\n".join(paragraphs)
 
 
+# Chunk size for streaming base64; a multiple of 3 so chunk encodings concatenate cleanly
+_B64_CHUNK_SIZE = 57 * 1024
+
+
+def _encode_pdf(pdf_path: Path) -> str:
+    """Base64-encode a PDF in fixed-size chunks so the raw file is never copied into memory.
+
+    The file is memory-mapped and encoded straight from slices of the mapping.
+    """
+    encoded = bytearray()
+    with pdf_path.open("rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:  # empty files cannot be mapped
+            return ""
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as view:
+            for i in range(0, len(view), _B64_CHUNK_SIZE):
+                encoded += base64.b64encode(view[i : i + _B64_CHUNK_SIZE])
+    return encoded.decode("ascii")
+
+
+# Largest syllabi sent to Claude; the API rejects requests over 32 MB or the 200k-token context.
+# PDFs travel base64-encoded (4 bytes per 3), so the limit applies to the encoded size and
+# leaves headroom for the system prompt and the rest of the request body.
+_MAX_PDF_BASE64_BYTES = 32_000_000 - 512 * 1024
+_MAX_DOCX_CHARS = 180_000
+
+
+class OversizeError(ValueError):
+    """Raised when a syllabus is too large to send to Claude."""
+
+
 def _build_message_content(file_path: Path) -> list[dict]:
-    """Build the Claude API message content blocks for a syllabus file."""
+    """Build the Claude API message content blocks for a syllabus file.
+
+    The syllabus block comes before the short instruction block. It is not
+    marked for the prompt cache: each syllabus is sent once, so caching it
+    would only add the cache-write surcharge. Raises OversizeError, before
+    anything is encoded where possible, for syllabi the API would reject.
+    """
     suffix = file_path.suffix.lower()
 
     if suffix == ".pdf":
-        pdf_b64 = base64.standard_b64encode(file_path.read_bytes()).decode("utf-8")
+        size = file_path.stat().st_size
+        encoded_size = 4 * -(-size // 3)
+        if encoded_size > _MAX_PDF_BASE64_BYTES:
+            raise OversizeError(
+                f"PDF is {size:,} bytes, {encoded_size:,} base64-encoded (limit {_MAX_PDF_BASE64_BYTES:,})"
+            )
+        pdf_b64 = _encode_pdf(file_path)
         return [
             {
                 "type": "document",
@@ -71,91 +279,469 @@ def _build_message_content(file_path: Path) -> list[dict]:
         ]
     elif suffix == ".docx":
         text = _extract_docx_text(file_path)
+        if len(text) > _MAX_DOCX_CHARS:
+            raise OversizeError(f"DOCX text is {len(text):,} characters (limit {_MAX_DOCX_CHARS:,})")
         return [
             {
                 "type": "text",
-                "text": (
-                    f"Below is the text content of a syllabus document ({file_path.name}):\n\n"
-                    f"{text}\n\n"
-                    "Analyze this syllabus and extract the requested information as JSON."
-                ),
+                "text": f"Below is the text content of a syllabus document ({file_path.name}):\n\n{text}",
+            },
+            {
+                "type": "text",
+                "text": "Analyze this syllabus and extract the requested information as JSON.",
             },
         ]
     else:
         raise ValueError(f"Unsupported file type: {suffix}")
 
 
-def analyze_syllabus(client: anthropic.Anthropic, file_path: Path) -> SyllabusReview:
-    """Send a single syllabus (PDF or DOCX) to Claude for analysis and return a validated SyllabusReview."""
-    message = client.messages.create(
-        model="claude-sonnet-4-5-20250929",
-        max_tokens=4096,
-        system=load_system_prompt(),
-        messages=[
+class _TokenBucket:
+    """A token bucket that refills continuously at a fixed rate per minute."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+
+    def wait_time(self, amount: float) -> float:
+        """Refill the bucket and return how many seconds until `amount` tokens are available."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return max(0.0, (amount - self.tokens) / self.rate)
+
+
+def _retry_delay(status_code: int, headers, attempt: int) -> float:
+    """Return how long to wait before retrying a rate-limited or overloaded request.
+
+    Honors the `retry-after` header. For rate limits (429) it then uses the latest
+    `anthropic-ratelimit-*-reset` timestamp, since those only describe the rate
+    limit buckets; otherwise it falls back to exponential backoff with jitter.
+    """
+    retry_after = headers.get("retry-after")
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+
+    if status_code == 429:
+        resets = []
+        for name in ("requests", "input-tokens", "output-tokens", "tokens"):
+            value = headers.get(f"anthropic-ratelimit-{name}-reset")
+            if value:
+                try:
+                    resets.append(datetime.fromisoformat(value))
+                except ValueError:
+                    pass
+        if resets:
+            return max(0.0, (max(resets) - datetime.now(timezone.utc)).total_seconds())
+
+    return 2**attempt + random.uniform(0, 1)
+
+
+class AnthropicGovernor:
+    """Keep concurrent Claude requests within the account's request and input-token rate limits.
+
+    Callers acquire from two token buckets (requests/min and input tokens/min)
+    before each request, and the estimated input tokens are replaced by the
+    reported usage once it succeeds. Rate-limit (429), overload (529) and other transient
+    error responses pause every caller for the server-advised delay and the
+    request is retried; connection errors are retried with backoff.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: int = REQUESTS_PER_MINUTE,
+        input_tokens_per_minute: int = INPUT_TOKENS_PER_MINUTE,
+        max_retries: int = MAX_RETRIES,
+    ):
+        self._requests = _TokenBucket(requests_per_minute)
+        self._input_tokens = _TokenBucket(input_tokens_per_minute)
+        self._max_retries = max_retries
+        self._lock = asyncio.Lock()
+        self._resume_at = 0.0
+
+    async def acquire(self, est_tokens: int) -> float:
+        """Wait until one request and `est_tokens` input tokens fit in the current budget.
+
+        Returns the number of input tokens taken from the budget.
+        """
+        # A single request larger than the per-minute budget only has to wait for a full bucket
+        est_tokens = min(est_tokens, self._input_tokens.capacity)
+        async with self._lock:
+            while True:
+                wait = max(
+                    self._resume_at - time.monotonic(),
+                    self._requests.wait_time(1),
+                    self._input_tokens.wait_time(est_tokens),
+                )
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+            self._requests.tokens -= 1
+            self._input_tokens.tokens -= est_tokens
+        return est_tokens
+
+    def _settle(self, charged: float, usage) -> None:
+        """Replace the estimated input tokens taken for a request by the usage Claude reported.
+
+        Cache reads do not count toward the input-token rate limit, but cache writes do.
+        """
+        actual = usage.input_tokens + (usage.cache_creation_input_tokens or 0)
+        bucket = self._input_tokens
+        bucket.tokens = min(bucket.capacity, bucket.tokens + charged - actual)
+
+    async def create_message(self, client: anthropic.AsyncAnthropic, est_tokens: int, **params):
+        """Call `client.messages.create`, waiting out rate limits and retrying transient failures."""
+        for attempt in range(self._max_retries + 1):
+            charged = await self.acquire(est_tokens)
+            try:
+                message = await client.messages.create(**params)
+            except anthropic.APIConnectionError as e:
+                if attempt == self._max_retries:
+                    raise
+                delay = 2**attempt + random.uniform(0, 1)
+                logger.warning("  Connection error (%s); retrying in %.1fs", e, delay)
+                await asyncio.sleep(delay)
+            except anthropic.APIStatusError as e:
+                if e.status_code not in _RETRYABLE_STATUSES or attempt == self._max_retries:
+                    raise
+                delay = _retry_delay(e.status_code, e.response.headers, attempt)
+                logger.warning("  API returned %d; pausing %.1fs before retrying", e.status_code, delay)
+                self._resume_at = max(self._resume_at, time.monotonic() + delay)
+            else:
+                self._settle(charged, message.usage)
+                return message
+
+
+def _new_client() -> anthropic.AsyncAnthropic:
+    """Return a Claude client for one event loop, to be used as `async with _new_client() as client`.
+
+    Its keep-alive connection pool, sized for MAX_CONCURRENCY, belongs to the
+    loop it runs on, so each asyncio.run makes one client, shares it across the
+    departments and programs of that run, and closes it when the run ends.
+    """
+    connections = max(32, MAX_CONCURRENCY)
+    return anthropic.AsyncAnthropic(
+        max_retries=0,  # AnthropicGovernor handles retries
+        timeout=120.0,
+        http_client=anthropic.DefaultAsyncHttpxClient(
+            limits=httpx.Limits(max_connections=connections, max_keepalive_connections=connections),
+        ),
+    )
+
+
+# Claude bills a PDF per page (its text plus an image of the page), typically 1,500-3,000 tokens
+_TOKENS_PER_PDF_PAGE = 2_000
+# Page size assumed when a PDF's page objects are hidden inside compressed object streams
+_PDF_BYTES_PER_PAGE = 50 * 1024
+_PDF_PAGE_RE = re.compile(rb"/Type\s*/Page(?![A-Za-z])")
+
+
+def _pdf_page_count(pdf_path: Path) -> int:
+    """Estimate the page count of a PDF from its uncompressed page objects, or from its size if there are none."""
+    with pdf_path.open("rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return 1
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            pages = sum(1 for _ in _PDF_PAGE_RE.finditer(mm))
+    return pages or -(-size // _PDF_BYTES_PER_PAGE)
+
+
+def _estimate_input_tokens(file_path: Path, content: list[dict]) -> int:
+    """Roughly estimate the input tokens of a request.
+
+    Text is counted at about 4 characters per token and PDFs per page. The
+    governor corrects its budget from the reported usage once the reply arrives.
+    """
+    tokens = len(_SYSTEM_PROMPT) // 4
+    for block in content:
+        if block["type"] == "document":
+            tokens += _pdf_page_count(file_path) * _TOKENS_PER_PDF_PAGE
+        else:
+            tokens += len(block["text"]) // 4
+    return tokens
+
+
+def _request_bytes(content: list[dict]) -> int:
+    """Roughly estimate the size of a request's prompt, which counts against the batch size cap."""
+    size = len(_SYSTEM_PROMPT)
+    for block in content:
+        if block["type"] == "document":
+            size += len(block["source"]["data"])
+        else:
+            size += len(block["text"])
+    return size
+
+
+def _prepare_request(file_path: Path) -> tuple[list[dict], int]:
+    """Build the message content for a syllabus and estimate its input tokens."""
+    content = _build_message_content(file_path)
+    return content, _estimate_input_tokens(file_path, content)
+
+
+def _extract_json(text: str) -> str:
+    """Return the JSON object in a model reply, dropping any code fences or prose around it."""
+    start = text.find("{")
+    end = text.rfind("}")
+    return text[start : end + 1] if start != -1 and end > start else text
+
+
+def _message_params(content: list[dict]) -> dict:
+    """Return the Messages API parameters for analyzing one syllabus."""
+    return {
+        "model": MODEL,
+        "max_tokens": MAX_TOKENS,
+        "system": _SYSTEM_BLOCKS,
+        "messages": [
             {
                 "role": "user",
-                "content": _build_message_content(file_path),
+                "content": content,
             }
         ],
-    )
+    }
+
+
+def _parse_review(text: str) -> SyllabusReview:
+    """Parse and validate Claude's reply text into a SyllabusReview.
+
+    The JSON is parsed by pydantic itself, without building an intermediate dict.
+    """
+    return _REVIEW_ADAPTER.validate_json(_extract_json(text))
+
 
-    text = message.content[0].text.strip()
-    # Strip markdown code fences if present
-    if text.startswith("```"):
-        text = text.split("\n", 1)[1]  # remove opening ```json line
-        text = text.rsplit("```", 1)[0]  # remove closing ```
-    raw = json.loads(text)
-    return SyllabusReview.model_validate(raw)
+async def analyze_syllabus(
+    client: anthropic.AsyncAnthropic, file_path: Path, governor: AnthropicGovernor
+) -> SyllabusReview:
+    """Send a single syllabus (PDF or DOCX) to Claude for analysis and return a validated SyllabusReview."""
+    # Reading and encoding the file runs on the loop's default executor so other requests keep
+    # streaming. Each asyncio.run creates and shuts down its own, so no thread pool outlives a run
+    # or is inherited half-initialized by the forked analyze_all workers.
+    loop = asyncio.get_running_loop()
+    content, est_tokens = await loop.run_in_executor(None, _prepare_request, file_path)
+    message = await governor.create_message(client, est_tokens, **_message_params(content))
+    return _parse_review(message.content[0].text)
 
 
 def _save_results(results: list[dict], output_path: Path) -> None:
     """Write the current results list to disk."""
-    output_path.write_text(json.dumps(results, indent=2), encoding="utf-8")
+    output_path.write_bytes(orjson.dumps(results, option=orjson.OPT_INDENT_2))
 
 
-def _analyze_files(client: anthropic.Anthropic, files: list[Path], output_path: Path) -> list[dict]:
-    """Analyze a list of syllabi files, saving results incrementally to output_path."""
-    # Load any existing results to support resuming
-    if output_path.exists():
-        results = json.loads(output_path.read_text(encoding="utf-8"))
-        done = {r["_source_file"] for r in results}
-    else:
-        results = []
-        done = set()
+def _truncate_partial_line(path: Path) -> None:
+    """Drop a trailing partial line left behind by an interrupted append."""
+    with path.open("r+b") as f:
+        end = pos = f.seek(0, os.SEEK_END)
+        while pos > 0:
+            step = min(4096, pos)
+            f.seek(pos - step)
+            i = f.read(step).rfind(b"\n")
+            if i != -1:
+                pos = pos - step + i + 1
+                break
+            pos -= step
+        if pos != end:
+            f.truncate(pos)
 
-    for file_path in files:
-        rel = file_path.name
-        if rel in done:
-            print(f"  Skipping {file_path.name} (already analyzed)")
-            continue
-        print(f"  Analyzing {file_path.name}...")
+
+def _results_stamp(output_path: Path) -> str:
+    """Return the `.done` header line identifying the current version of a JSON results file."""
+    try:
+        st = output_path.stat()
+    except FileNotFoundError:
+        return "# results 0 0"
+    return f"# results {st.st_mtime_ns} {st.st_size}"
+
+
+def _load_results(output_path: Path) -> list[dict]:
+    """Load a department's JSON results file, or an empty list if there is none."""
+    return orjson.loads(output_path.read_bytes()) if output_path.exists() else []
+
+
+def _load_result_log(log_path: Path) -> list[dict]:
+    """Load the results appended to a department's `.jsonl` log since its JSON file was written."""
+    if not log_path.exists():
+        return []
+    _truncate_partial_line(log_path)
+    return [orjson.loads(line) for line in log_path.read_bytes().splitlines()]
+
+
+def _write_done(done_path: Path, output_path: Path, names: Iterable[str]) -> None:
+    """Write the `.done` sidecar: the JSON file's stamp, then one processed filename per line."""
+    lines = [_results_stamp(output_path), *sorted(names)]
+    done_path.write_text("".join(f"{line}\n" for line in lines), encoding="utf-8")
+
+
+def _load_done(output_path: Path) -> set[str]:
+    """Return the syllabus filenames already processed for a results file.
+
+    Reads the `.done` sidecar without parsing any results. It is rebuilt from
+    the JSON file and the `.jsonl` log when the JSON's mtime or size no longer
+    matches the stamp it was written with, e.g. after the JSON was edited.
+    """
+    done_path = output_path.with_suffix(".done")
+    log_path = output_path.with_suffix(".jsonl")
+    if done_path.exists():
+        _truncate_partial_line(done_path)
+        stamp, *names = done_path.read_text(encoding="utf-8").splitlines() or [""]
+        if stamp == _results_stamp(output_path):
+            if log_path.exists():
+                _truncate_partial_line(log_path)
+            return set(names)
+
+    records = chain(_load_results(output_path), _load_result_log(log_path))
+    done = {r["_source_file"] for r in records}
+    _write_done(done_path, output_path, done)
+    return done
+
+
+def _append_result(log: BinaryIO, done_log: TextIO, result: dict) -> None:
+    """Append one result to the open `.jsonl` log and its filename to the `.done` sidecar."""
+    log.write(orjson.dumps(result) + b"\n")
+    log.flush()
+    done_log.write(result["_source_file"] + "\n")
+    done_log.flush()
+
+
+def _append_results(output_path: Path, results: list[dict]) -> None:
+    """Append several results to the `.jsonl` log and `.done` sidecar of a results file."""
+    if not results:
+        return
+    with (
+        output_path.with_suffix(".jsonl").open("ab") as log,
+        output_path.with_suffix(".done").open("a", encoding="utf-8") as done_log,
+    ):
+        for result in results:
+            _append_result(log, done_log, result)
+
+
+def _finalize_results(output_path: Path) -> list[dict]:
+    """Merge the `.jsonl` log into the JSON results file and return its records.
+
+    A file logged again replaces its earlier result. Without a log the JSON
+    file is returned as is and nothing is written.
+    """
+    log_path = output_path.with_suffix(".jsonl")
+    logged = _load_result_log(log_path)
+    if not logged:
+        log_path.unlink(missing_ok=True)
+        return _load_results(output_path)
+
+    merged = {r["_source_file"]: r for r in chain(_load_results(output_path), logged)}
+    _save_results(list(merged.values()), output_path)
+    log_path.unlink()
+    _write_done(output_path.with_suffix(".done"), output_path, merged)
+    return list(merged.values())
+
+
+def _replace_file(path: Path, write: Callable[[BinaryIO], None]) -> None:
+    """Write a file through a temporary file beside it and move it into place, so readers never see it half-written."""
+    tmp = tempfile.NamedTemporaryFile(dir=path.parent, prefix=path.name, delete=False)
+    try:
+        with tmp:
+            write(tmp)
+        os.replace(tmp.name, path)
+    except BaseException:
+        os.unlink(tmp.name)
+        raise
+
+
+def _write_catalog() -> None:
+    """Write every department's successful results to one Parquet catalog.
+
+    Rubric sections are stored as nested struct columns. The dashboard reads the
+    catalog instead of the JSON files while it is newer than all of them.
+    """
+    records = [
+        r
+        for dept_file in RESULTS_DIR.glob("*.json")
+        for r in orjson.loads(dept_file.read_bytes())
+        if "_error" not in r
+    ]
+    table = pa.Table.from_pylist(records)
+    _replace_file(CATALOG_FILE, lambda f: pq.write_table(table, f, compression="zstd"))
+    logger.info("Wrote %d results to %s", len(records), CATALOG_FILE.name)
+
+
+async def _analyze_one(
+    client: anthropic.AsyncAnthropic, file_path: Path, sem: asyncio.Semaphore, governor: AnthropicGovernor
+) -> dict:
+    """Analyze a single syllabus once a concurrency slot is free and return its result record."""
+    rel = file_path.name
+    async with sem:
+        logger.debug("  Analyzing %s...", file_path.name)
         try:
-            review = analyze_syllabus(client, file_path)
-            result = review.model_dump()
-            result["_source_file"] = rel
-            results.append(result)
+            review = await analyze_syllabus(client, file_path, governor)
+        except OversizeError as e:
+            logger.warning("  Skipping %s: %s", file_path.name, e)
+            return {"_source_file": rel, "_error": "oversize"}
         except Exception as e:
-            print(f"  ERROR processing {file_path.name}: {e}")
-            results.append({"_source_file": rel, "_error": str(e)})
-        _save_results(results, output_path)
+            logger.error("  ERROR processing %s: %s", file_path.name, e)
+            return {"_source_file": rel, "_error": str(e)}
+    result = review.model_dump()
+    result["_source_file"] = rel
+    return result
+
+
+async def _analyze_files(
+    client: anthropic.AsyncAnthropic,
+    files: list[Path],
+    output_path: Path,
+    governor: AnthropicGovernor | None = None,
+    max_concurrency: int = MAX_CONCURRENCY,
+) -> list[dict]:
+    """Analyze a list of syllabi files concurrently, saving results to output_path.
 
-    return results
+    Results are logged to a `.jsonl` file as they arrive and merged into
+    output_path once all files are done.
+    """
+    if governor is None:
+        governor = AnthropicGovernor()
+
+    # Load the names of already processed files to support resuming
+    done = _load_done(output_path)
+
+    pending: list[Path] = []
+    for file_path in files:
+        if file_path.name in done:
+            logger.debug("  Skipping %s (already analyzed)", file_path.name)
+            continue
+        pending.append(file_path)
+    logger.info("  %d to analyze, %d already analyzed", len(pending), len(files) - len(pending))
+
+    # Results are appended and logged on this task as each request finishes, so no lock is needed
+    if pending:
+        sem = asyncio.Semaphore(max_concurrency)
+        with (
+            output_path.with_suffix(".jsonl").open("ab") as log,
+            output_path.with_suffix(".done").open("a", encoding="utf-8") as done_log,
+        ):
+            tasks = [_analyze_one(client, f, sem, governor) for f in pending]
+            for n, task in enumerate(asyncio.as_completed(tasks), 1):
+                _append_result(log, done_log, await task)
+                if n % _PROGRESS_EVERY == 0 or n == len(pending):
+                    logger.info("  %d/%d analyzed", n, len(pending))
+
+    return _finalize_results(output_path)
 
 
-def analyze_department(client: anthropic.Anthropic, department: str) -> list[dict]:
+async def analyze_department(
+    client: anthropic.AsyncAnthropic,
+    department: str,
+    governor: AnthropicGovernor | None = None,
+    max_concurrency: int = MAX_CONCURRENCY,
+) -> list[dict]:
     """Analyze all syllabi (PDF and DOCX) for a department in the flat syllabi directory."""
-    files = sorted(
-        f
-        for f in SYLLABI_DIR.iterdir()
-        if f.suffix.lower() in SUPPORTED_EXTENSIONS
-        and _extract_department(f.name) == department
-    )
+    files = [f for _, dept, f in _scan_syllabi() if dept == department]
     if not files:
-        print(f"No supported files found for department {department}")
+        logger.warning("No supported files found for department %s", department)
         return []
 
     RESULTS_DIR.mkdir(parents=True, exist_ok=True)
-    return _analyze_files(client, files, RESULTS_DIR / f"{department}.json")
+    return await _analyze_files(client, files, RESULTS_DIR / f"{department}.json", governor, max_concurrency)
 
 
 def _normalize_course_code(course: str) -> str:
@@ -165,10 +751,9 @@ def _normalize_course_code(course: str) -> str:
     trailing zeros (e.g. "ABE 201" -> "ABE20100", "POL 10100" -> "POL10100").
     """
     code = course.replace(" ", "").upper()
-    m = re.match(r"^([A-Z]+)(\d+)$", code)
-    if not m:
+    dept, num = _parse_code(code)
+    if not num or len(dept) + len(num) != len(code):
         return code
-    dept, num = m.group(1), m.group(2)
     return dept + num.ljust(5, "0")
 
 
@@ -179,14 +764,15 @@ def find_missing_syllabi(program_name: str) -> list[str] | None:
     programs.json) that have no matching files, or None if the program is not
     found.
     """
+    _configure_logging()
     if not PROGRAMS_FILE.exists():
-        print(f"Programs file not found: {PROGRAMS_FILE}")
+        logger.error("Programs file not found: %s", PROGRAMS_FILE)
         return None
 
-    programs = json.loads(PROGRAMS_FILE.read_text(encoding="utf-8"))
+    programs = orjson.loads(PROGRAMS_FILE.read_bytes())
     if program_name not in programs:
-        print(f"Program not found: {program_name}")
-        print(f"Available programs: {', '.join(programs.keys())}")
+        logger.error("Program not found: %s", program_name)
+        logger.error("Available programs: %s", ", ".join(programs.keys()))
         return None
 
     courses = programs[program_name]
@@ -195,27 +781,21 @@ def find_missing_syllabi(program_name: str) -> list[str] | None:
     excluded: set[str] = set()
     if EXCLUDED_COURSES_FILE.exists():
         excluded = {c.replace(" ", "").upper()
-                    for c in json.loads(EXCLUDED_COURSES_FILE.read_text(encoding="utf-8"))}
+                    for c in orjson.loads(EXCLUDED_COURSES_FILE.read_bytes())}
 
     # Collect all course codes present in the syllabi directory
-    syllabi_codes = {
-        f.stem.split("_")[0].upper()
-        for f in SYLLABI_DIR.iterdir()
-        if f.suffix.lower() in SUPPORTED_EXTENSIONS
-    }
+    syllabi_codes = {code for code, _, _ in _scan_syllabi()}
 
-    excluded_in_program = [c for c in courses if _normalize_course_code(c) in excluded]
-    missing = [c for c in courses
-               if _normalize_course_code(c) not in syllabi_codes
-               and _normalize_course_code(c) not in excluded]
-    missing.sort()
+    # Normalize each course code once; every program entry is kept, even if two normalize alike
+    normalized = [(c, _normalize_course_code(c)) for c in courses]
+    excluded_in_program = [c for c, n in normalized if n in excluded]
+    missing = sorted(c for c, n in normalized if n not in syllabi_codes and n not in excluded)
 
     found = len(courses) - len(missing) - len(excluded_in_program)
-    print(f"Program '{program_name}': {len(courses)} courses, "
-          f"{found} found, {len(missing)} missing, {len(excluded_in_program)} excluded")
-    if missing:
-        for c in missing:
-            print(f"  {c}")
+    logger.info("Program '%s': %d courses, %d found, %d missing, %d excluded",
+                program_name, len(courses), found, len(missing), len(excluded_in_program))
+    for c in missing:
+        logger.info("  %s", c)
 
     # Save results to JSON
     missing_dir = Path(__file__).parents[2] / "data" / "missing"
@@ -231,8 +811,8 @@ def find_missing_syllabi(program_name: str) -> list[str] | None:
         "excluded_count": len(excluded_in_program),
         "excluded_courses": sorted(excluded_in_program),
     }
-    output_path.write_text(json.dumps(output, indent=2), encoding="utf-8")
-    print(f"Results saved to {output_path}")
+    output_path.write_bytes(orjson.dumps(output, option=orjson.OPT_INDENT_2))
+    logger.info("Results saved to %s", output_path)
 
     return missing
 
@@ -242,83 +822,273 @@ def analyze_program(program_name: str):
 
     Results are saved to per-department result files so the dashboard can display them.
     """
+    _configure_logging()
     if not PROGRAMS_FILE.exists():
-        print(f"Programs file not found: {PROGRAMS_FILE}")
+        logger.error("Programs file not found: %s", PROGRAMS_FILE)
         return
 
-    programs = json.loads(PROGRAMS_FILE.read_text(encoding="utf-8"))
+    programs = orjson.loads(PROGRAMS_FILE.read_bytes())
     if program_name not in programs:
-        print(f"Program not found: {program_name}")
-        print(f"Available programs: {', '.join(programs.keys())}")
+        logger.error("Program not found: %s", program_name)
+        logger.error("Available programs: %s", ", ".join(programs.keys()))
         return
 
     # Convert course codes like "POL 10100" to filename prefixes like "POL10100"
     course_prefixes = {c.replace(" ", "").upper() for c in programs[program_name]}
 
-    # Find matching syllabi files
-    all_files = sorted(
-        f
-        for f in SYLLABI_DIR.iterdir()
-        if f.suffix.lower() in SUPPORTED_EXTENSIONS
-    )
-
     # Match files whose name starts with a course prefix (before the first underscore)
-    matching_files: list[Path] = []
-    for f in all_files:
-        # Extract course code from filename (e.g. "POL10100" from "POL10100_Spring2026_X.pdf")
-        code = f.stem.split("_")[0].upper()
-        if code in course_prefixes:
-            matching_files.append(f)
+    matching_files = [(dept, f) for code, dept, f in _scan_syllabi() if code in course_prefixes]
 
     if not matching_files:
-        print(f"No syllabi files found for program '{program_name}'")
-        print(f"  Looking for files matching {len(course_prefixes)} course codes")
+        logger.warning("No syllabi files found for program '%s'", program_name)
+        logger.warning("  Looking for files matching %d course codes", len(course_prefixes))
         return
 
     # Group files by department and analyze into per-department result files
     dept_files: dict[str, list[Path]] = {}
-    for f in matching_files:
-        dept = _extract_department(f.name)
+    for dept, f in matching_files:
         if dept:
             dept_files.setdefault(dept, []).append(f)
 
-    client = anthropic.Anthropic()
     RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+    total = asyncio.run(_analyze_program_files(program_name, dept_files))
+    _write_catalog()
+    logger.info("Done. %d total results across %d departments for '%s'", total, len(dept_files), program_name)
 
-    total = 0
-    for dept, files in sorted(dept_files.items()):
-        print(f"Processing {dept} ({len(files)} files for {program_name})")
-        results = _analyze_files(client, files, RESULTS_DIR / f"{dept}.json")
-        total += len(results)
-        print(f"  {len(results)} total results for {dept}")
 
-    print(f"\nDone. {total} total results across {len(dept_files)} departments for '{program_name}'")
+async def _analyze_program_files(program_name: str, dept_files: dict[str, list[Path]]) -> int:
+    """Analyze a program's syllabi into per-department result files and return the result count."""
+    async with _new_client() as client:
+        governor = AnthropicGovernor()
+        total = 0
+        for dept, files in sorted(dept_files.items()):
+            logger.info("Processing %s (%d files for %s)", dept, len(files), program_name)
+            results = await _analyze_files(client, files, RESULTS_DIR / f"{dept}.json", governor)
+            total += len(results)
+            logger.info("  %d total results for %s", len(results), dept)
+        return total
 
 
 def analyze_all(departments: list[str] | None = None):
-    """Analyze syllabi for all (or specified) departments and save results."""
-    client = anthropic.Anthropic()
+    """Analyze syllabi for all (or specified) departments and save results.
 
+    Departments are sharded across worker processes so file preparation and
+    result writing use several cores. The processes split MAX_CONCURRENCY and
+    the account rate limits evenly, keeping the totals unchanged.
+    """
+    _configure_logging()
     if departments is None:
-        departments = sorted(
-            {
-                _extract_department(f.name)
-                for f in SYLLABI_DIR.iterdir()
-                if f.suffix.lower() in SUPPORTED_EXTENSIONS
-                and _extract_department(f.name)
-            }
-        )
+        departments = sorted({dept for _, dept, _ in _scan_syllabi() if dept})
+
+    if not departments:
+        logger.warning("No syllabi files found in syllabi/")
+        return
+
+    workers = min(len(departments), os.cpu_count() or 1, MAX_CONCURRENCY)
+    if workers <= 1:
+        asyncio.run(_analyze_departments(departments))
+    else:
+        logger.info("Analyzing %d departments across %d processes", len(departments), workers)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for dept, count in zip(departments, executor.map(_run_department, departments, [workers] * len(departments))):
+                logger.info("  %d total results for %s", count, dept)
+    _write_catalog()
+
+
+def _run_department(department: str, workers: int) -> int:
+    """Analyze one department in a worker process and return its result count.
+
+    The worker gets a 1/workers share of the concurrency and rate limits.
+    """
+    _configure_logging()
+    logger.info("Processing department: %s", department)
+    governor = AnthropicGovernor(
+        requests_per_minute=max(1, REQUESTS_PER_MINUTE // workers),
+        input_tokens_per_minute=max(1, INPUT_TOKENS_PER_MINUTE // workers),
+    )
+    max_concurrency = max(1, MAX_CONCURRENCY // workers)
+    return len(asyncio.run(_analyze_department_in_worker(department, governor, max_concurrency)))
+
+
+async def _analyze_department_in_worker(
+    department: str, governor: AnthropicGovernor, max_concurrency: int
+) -> list[dict]:
+    """Analyze one department with a client for this worker's run."""
+    async with _new_client() as client:
+        return await analyze_department(client, department, governor, max_concurrency)
+
+
+async def _analyze_departments(departments: list[str]) -> None:
+    """Analyze each department in turn, sharing one async client across them."""
+    async with _new_client() as client:
+        governor = AnthropicGovernor()
+        for dept in departments:
+            logger.info("Processing department: %s", dept)
+            results = await analyze_department(client, dept, governor)
+            logger.info("  %d total results for %s", len(results), dept)
+
+
+def analyze_all_batched(departments: list[str] | None = None):
+    """Analyze syllabi for all (or specified) departments through the Message Batches API.
+
+    Batches cost half as much per token as live requests and are not subject to
+    the per-minute rate limits, which suits offline runs. Files already recorded
+    in a department's results are skipped. Submitted batches are saved to
+    BATCH_STATE_FILE until they are collected, so an interrupted run resumes
+    collecting them instead of submitting them again.
+    """
+    _configure_logging()
+    if departments is None:
+        departments = sorted({dept for _, dept, _ in _scan_syllabi() if dept})
 
     if not departments:
-        print("No syllabi files found in syllabi/")
+        logger.warning("No syllabi files found in syllabi/")
         return
 
+    with_files = {dept for _, dept, _ in _scan_syllabi()}
+    for dept in departments:
+        if dept not in with_files:
+            logger.warning("No supported files found for department %s", dept)
+    departments = [dept for dept in departments if dept in with_files]
+
+    RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+    asyncio.run(_analyze_departments_batched(departments))
+    _write_catalog()
+
+
+async def _analyze_departments_batched(departments: list[str]) -> None:
+    """Submit every unprocessed syllabus of the departments as message batches and record the results.
+
+    Batches left uncollected by an interrupted run are collected first, so they
+    are not paid for twice.
+    """
+    async with _new_client() as client:
+        if BATCH_STATE_FILE.exists():
+            state = orjson.loads(BATCH_STATE_FILE.read_bytes())
+            logger.info("Collecting %d batches submitted by an earlier run", len(state["batch_ids"]))
+            await _collect_batches(client, state)
+            _finalize_departments(sorted({dept for dept, _ in state["requests"].values()}))
+            BATCH_STATE_FILE.unlink()
+
+        state = await _submit_batches(client, departments)
+        await _collect_batches(client, state)
+        _finalize_departments(departments)
+        BATCH_STATE_FILE.unlink(missing_ok=True)
+
+
+async def _submit_batches(client: anthropic.AsyncAnthropic, departments: list[str]) -> dict:
+    """Submit the unprocessed syllabi of the departments as message batches.
+
+    Returns the batch state: the submitted batch IDs, and the department and
+    filename of each request by custom ID. The state is saved to
+    BATCH_STATE_FILE after every submission, before any polling starts.
+    """
+    pending: list[tuple[str, Path]] = []
+    for dept in departments:
+        done = _load_done(RESULTS_DIR / f"{dept}.json")
+        files = [f for _, d, f in _scan_syllabi() if d == dept and f.name not in done]
+        logger.info("%s: %d syllabi to analyze", dept, len(files))
+        pending.extend((dept, f) for f in files)
+
+    state: dict = {"batch_ids": [], "requests": {}}
+    if not pending:
+        logger.info("Nothing to analyze")
+        return state
+
+    # Custom IDs must be short alphanumerics, so requests are keyed by index rather than filename
+    requests: list[dict] = []
+    size = 0
+    oversize: dict[str, list[dict]] = {}
+    for i, (dept, file_path) in enumerate(pending):
+        try:
+            content = _build_message_content(file_path)
+        except OversizeError as e:
+            logger.warning("  Skipping %s: %s", file_path.name, e)
+            oversize.setdefault(dept, []).append({"_source_file": file_path.name, "_error": "oversize"})
+            continue
+        request_size = _request_bytes(content)
+        if requests and (len(requests) == _BATCH_MAX_REQUESTS or size + request_size > _BATCH_MAX_BYTES):
+            await _submit_batch(client, requests, state)
+            requests, size = [], 0
+        custom_id = f"syllabus-{i}"
+        requests.append({"custom_id": custom_id, "params": _message_params(content)})
+        state["requests"][custom_id] = [dept, file_path.name]
+        size += request_size
+    if requests:
+        await _submit_batch(client, requests, state)
+    del requests
+
+    for dept, results in oversize.items():
+        _append_results(RESULTS_DIR / f"{dept}.json", results)
+    return state
+
+
+async def _submit_batch(client: anthropic.AsyncAnthropic, requests: list[dict], state: dict) -> None:
+    """Submit one message batch and save its ID to the batch state file."""
+    batch = await client.messages.batches.create(requests=requests)
+    state["batch_ids"].append(batch.id)
+    _replace_file(BATCH_STATE_FILE, lambda f: f.write(orjson.dumps(state)))
+    logger.info("Submitted batch %s (%d syllabi)", batch.id, len(requests))
+
+
+async def _collect_batches(client: anthropic.AsyncAnthropic, state: dict) -> None:
+    """Collect every batch in a batch state into the department result logs."""
+    for batch_id in state["batch_ids"]:
+        await _collect_batch(client, batch_id, state["requests"])
+
+
+def _finalize_departments(departments: list[str]) -> None:
+    """Write the JSON results file of each department from its result log."""
     for dept in departments:
-        print(f"Processing department: {dept}")
-        results = analyze_department(client, dept)
-        print(f"  {len(results)} total results for {dept}")
+        results = _finalize_results(RESULTS_DIR / f"{dept}.json")
+        logger.info("  %d total results for %s", len(results), dept)
+
+
+async def _collect_batch(
+    client: anthropic.AsyncAnthropic, batch_id: str, requests: dict[str, list[str]]
+) -> None:
+    """Wait for a message batch to end and append its results to the department result logs.
+
+    Canceled and expired requests are not recorded, so the next run retries them.
+    Collecting a batch again only logs its results again; the latest wins.
+    """
+    while (batch := await client.messages.batches.retrieve(batch_id)).processing_status != "ended":
+        counts = batch.request_counts
+        logger.info("  Batch %s: %d processing, %d succeeded", batch_id, counts.processing, counts.succeeded)
+        await asyncio.sleep(_BATCH_POLL_SECONDS)
+
+    by_dept: dict[str, list[dict]] = {}
+    async for entry in await client.messages.batches.results(batch_id):
+        dept, rel = requests[entry.custom_id]
+        if entry.result.type == "succeeded":
+            try:
+                result = _parse_review(entry.result.message.content[0].text).model_dump()
+                result["_source_file"] = rel
+            except Exception as e:
+                logger.error("  ERROR processing %s: %s", rel, e)
+                result = {"_source_file": rel, "_error": str(e)}
+        elif entry.result.type == "errored":
+            error = entry.result.error.error.message
+            logger.error("  ERROR processing %s: %s", rel, error)
+            result = {"_source_file": rel, "_error": error}
+        else:
+            logger.warning("  %s was %s; it will be retried on the next run", rel, entry.result.type)
+            continue
+        by_dept.setdefault(dept, []).append(result)
+
+    for dept, results in by_dept.items():
+        _append_results(RESULTS_DIR / f"{dept}.json", results)
 
 
 if __name__ == "__main__":
-    depts = sys.argv[1:] if len(sys.argv) > 1 else None
-    analyze_all(depts)
+    _configure_logging()
+    args = sys.argv[1:]
+    if "-h" in args or "--help" in args:
+        print(__doc__)
+        sys.exit()
+    batched = "--batch" in args
+    depts = [a for a in args if a != "--batch"] or None
+    if batched:
+        analyze_all_batched(depts)
+    else:
+        analyze_all(depts)
@@ -1,14 +1,19 @@
 """Streamlit dashboard for Purdue syllabi analysis results."""
 
-import json
-from pathlib import Path
+import functools
+from collections import Counter
 
-import pandas as pd
+import pyarrow as pa
 import streamlit as st
 
-DATA_DIR = Path(__file__).parents[2] / "data"
-RESULTS_DIR = DATA_DIR / "results"
-PROGRAMS_FILE = DATA_DIR / "programs.json"
+from loaders import (
+    get_departments,
+    get_programs,
+    load_department,
+    load_program_courses,
+    load_program_records,
+    results_version,
+)
 
 RUBRIC_SECTIONS = {
     "pillars": "Pillars",
@@ -19,44 +24,29 @@ RUBRIC_SECTIONS = {
 }
 
 
-def load_department(dept_file: Path) -> list[dict]:
-    """Load a single department JSON results file."""
-    with open(dept_file, encoding="utf-8") as f:
-        return [r for r in json.load(f) if "_error" not in r]
+@functools.lru_cache(maxsize=None)
+def _label(key: str) -> str:
+    """Return the display label for a snake_case key (a rubric criterion or decision), formatting each once."""
+    return key.replace("_", " ").title()
 
 
-def get_departments() -> dict[str, Path]:
-    """Return a mapping of department name -> json file path."""
-    return {
-        p.stem: p
-        for p in sorted(RESULTS_DIR.glob("*.json"))
-    }
-
-
-def load_all_courses() -> list[dict]:
-    """Load all courses from every department results file."""
-    all_courses = []
-    for dept_file in RESULTS_DIR.glob("*.json"):
-        all_courses.extend(load_department(dept_file))
-    return all_courses
-
-
-def get_programs() -> dict[str, list[str]]:
-    """Return a mapping of program name -> list of course numbers."""
-    if not PROGRAMS_FILE.exists():
-        return {}
-    with open(PROGRAMS_FILE, encoding="utf-8") as f:
-        return json.load(f)
-
+@st.cache_data(show_spinner=False)
+def build_summary(key: tuple, _rows: list[tuple[str, str, str]]) -> pa.Table:
+    """Build the summary table from (course, title, decision) rows, reusing it across reruns.
 
-def load_program_courses(program_courses: list[str], all_courses: list[dict]) -> list[dict]:
-    """Filter all courses to those matching a program's course list."""
-    # Normalize course numbers for matching (strip spaces, uppercase)
-    normalized = {c.replace(" ", "").upper() for c in program_courses}
-    return [
-        c for c in all_courses
-        if (c["course_information"].get("course_number") or "").replace(" ", "").upper() in normalized
-    ]
+    The cache is keyed only on key, which names the view and the version of its
+    source files, so the rows themselves are never hashed. It is built directly
+    as an Arrow table, which st.dataframe sends to the browser without a pandas
+    DataFrame in between.
+    """
+    courses, titles, decisions = zip(*_rows) if _rows else ((), (), ())
+    return pa.table(
+        {
+            "Course": pa.array(courses, pa.string()),
+            "Title": pa.array(titles, pa.string()),
+            "Decision": pa.array([_label(d) for d in decisions], pa.string()),
+        }
+    )
 
 
 def render_decision_badge(decision: str):
@@ -79,9 +69,8 @@ def render_decision_badge(decision: str):
 def render_section_summary(section_key: str, section_data: dict):
     """Render a rubric section as a table of criteria with scores and expandable rationales."""
     section_label = RUBRIC_SECTIONS[section_key]
-    scores = {k: v["score"] for k, v in section_data.items()}
-    total = sum(scores.values())
-    count = len(scores)
+    total = sum(v["score"] for v in section_data.values())
+    count = len(section_data)
 
     if section_key == "exclusions":
         header = f"{section_label} ({total} flagged)"
@@ -92,7 +81,7 @@ def render_section_summary(section_key: str, section_data: dict):
         for criterion_key, criterion_data in section_data.items():
             score = criterion_data["score"]
             rationale = criterion_data["rationale"]
-            label = criterion_key.replace("_", " ").title()
+            label = _label(criterion_key)
 
             if section_key == "exclusions":
                 icon = "🚩" if score == 1 else "✅"
@@ -125,24 +114,27 @@ def main():
 
     if view_mode == "Program":
         selected_program = st.sidebar.selectbox("Program", list(programs.keys()))
-        all_courses = load_all_courses()
-        results = load_program_courses(programs[selected_program], all_courses)
+        program_courses = programs[selected_program]
+        results = load_program_courses(program_courses, load_program_records(program_courses))
+        summary_key = ("program", selected_program, tuple(program_courses), results_version())
 
         if not results:
             st.info(f"No matching results for **{selected_program}**. Check that the course numbers in `data/programs.json` match analyzed courses.")
             return
 
         summary_title = f"{selected_program}"
+        analyzed = {
+            (r["course_information"].get("course_number") or "").replace(" ", "").upper()
+            for r in results
+        }
         missing = [
             c for c in programs[selected_program]
-            if c.replace(" ", "").upper() not in {
-                (r["course_information"].get("course_number") or "").replace(" ", "").upper()
-                for r in results
-            }
+            if c.replace(" ", "").upper() not in analyzed
         ]
     else:
         selected_dept = st.sidebar.selectbox("Department", list(departments.keys()))
         results = load_department(departments[selected_dept])
+        summary_key = ("department", selected_dept, results_version([departments[selected_dept]]))
 
         if not results:
             st.info(f"No valid results for {selected_dept}.")
@@ -154,10 +146,10 @@ def main():
     # Summary
     st.header(f"{summary_title} Summary")
 
-    decisions = [r["course_analysis"]["review_decision"]["decision"] for r in results]
-    approved = decisions.count("approved")
-    not_approved = decisions.count("not_approved")
-    deferred = decisions.count("deferred")
+    decisions = Counter(r["course_analysis"]["review_decision"]["decision"] for r in results)
+    approved = decisions["approved"]
+    not_approved = decisions["not_approved"]
+    deferred = decisions["deferred"]
 
     col1, col2, col3, col4 = st.columns(4)
     col1.metric("Total Courses", len(results))
@@ -168,24 +160,24 @@ def main():
     if missing:
         st.warning(f"Courses not yet analyzed: {', '.join(missing)}")
 
-    # Build course list used by both the table and the sidebar selector
-    course_labels = [
-        r["course_information"].get("course_number") or r.get("_source_file", "Unknown")
-        for r in results
-    ]
+    # Build the course list used by both the table and the sidebar selector, and
+    # the summary table rows, in one pass. label_to_idx keeps the first row for
+    # each label, matching what the selectbox shows.
+    course_labels = []
+    rows = []
+    label_to_idx = {}
+    for i, r in enumerate(results):
+        info = r["course_information"]
+        label = info.get("course_number") or r.get("_source_file", "Unknown")
+        course_labels.append(label)
+        rows.append((label, info.get("course_title") or "", r["course_analysis"]["review_decision"]["decision"]))
+        label_to_idx.setdefault(label, i)
 
     # Summary table (clickable)
-    summary_df = pd.DataFrame([
-        {
-            "Course": course_labels[i],
-            "Title": r["course_information"].get("course_title") or "",
-            "Decision": r["course_analysis"]["review_decision"]["decision"].replace("_", " ").title(),
-        }
-        for i, r in enumerate(results)
-    ])
+    summary_table = build_summary(summary_key, rows)
 
     event = st.dataframe(
-        summary_df,
+        summary_table,
         width='stretch',
         hide_index=True,
         on_select="rerun",
@@ -206,7 +198,7 @@ def main():
         "Course", course_labels, key="course_select"
     )
 
-    course_data = results[course_labels.index(selected_course)]
+    course_data = results[label_to_idx[selected_course]]
 
     # Course detail view
     st.divider()
@@ -0,0 +1,204 @@
+"""Load analysis results for the dashboard.
+
+Every loader is cached with st.cache_data and keyed on the source file's
+modification time, so each results file is parsed once per change no matter
+how many views read it.
+"""
+
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+from pathlib import Path
+
+import ijson
+import orjson
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import streamlit as st
+
+DATA_DIR = Path(__file__).parents[2] / "data"
+RESULTS_DIR = DATA_DIR / "results"
+PROGRAMS_FILE = DATA_DIR / "programs.json"
+CATALOG_FILE = DATA_DIR / "results.parquet"
+COURSE_INDEX_FILE = DATA_DIR / "course_index.json"
+
+# Larger results files are stream-parsed so their full JSON tree, error records
+# included, is never held in memory at once
+_STREAM_PARSE_BYTES = 64 * 1024 * 1024
+
+
+def _mtime_ns(path: Path) -> int:
+    """Return a path's modification time (0 if missing), used to invalidate cached loads."""
+    try:
+        return path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+
+def _result_files() -> list[Path]:
+    """Return the department results files, in directory order.
+
+    A single scandir pass with a suffix check is cheaper than glob's pattern matching.
+    """
+    try:
+        with os.scandir(RESULTS_DIR) as entries:
+            return [Path(e.path) for e in entries if e.name.endswith(".json") and e.is_file()]
+    except FileNotFoundError:
+        return []
+
+
+@st.cache_data(show_spinner=False)
+def _load_department_cached(dept_file: Path, mtime_ns: int) -> list[dict]:
+    if dept_file.stat().st_size < _STREAM_PARSE_BYTES:
+        return [r for r in orjson.loads(dept_file.read_bytes()) if "_error" not in r]
+    with dept_file.open("rb") as f:
+        return [r for r in ijson.items(f, "item", use_float=True) if "_error" not in r]
+
+
+def load_department(dept_file: Path) -> list[dict]:
+    """Load a single department JSON results file, re-reading it only when it changes."""
+    return _load_department_cached(dept_file, _mtime_ns(dept_file))
+
+
+@st.cache_data(show_spinner=False)
+def _get_departments_cached(mtime_ns: int) -> dict[str, Path]:
+    return {
+        p.stem: p
+        for p in sorted(_result_files())
+    }
+
+
+def get_departments() -> dict[str, Path]:
+    """Return a mapping of department name -> json file path."""
+    return _get_departments_cached(_mtime_ns(RESULTS_DIR))
+
+
+@st.cache_data(show_spinner=False)
+def _load_catalog_cached(mtime_ns: int) -> pa.Table:
+    return pq.read_table(CATALOG_FILE)
+
+
+def results_version(files: list[Path] | None = None) -> int:
+    """Return the newest modification time of the given results files (all of them by default).
+
+    The results directory is included so added or removed files also change it.
+    It keys caches of anything built from the records.
+    """
+    return max(_mtime_ns(RESULTS_DIR), *map(_mtime_ns, _result_files() if files is None else files))
+
+
+def _newer_than_results(mtime_ns: int, files: list[Path]) -> bool:
+    """Return whether a file derived from the results is at least as new as the directory and every results file."""
+    return bool(files) and mtime_ns >= max(_mtime_ns(RESULTS_DIR), *map(_mtime_ns, files))
+
+
+def _load_records(files: list[Path]) -> pa.Table:
+    """Combine department results files into one Arrow table.
+
+    The files are read on a thread pool so their I/O overlaps; each one is cached
+    by load_department, so only changed files are actually re-read.
+    """
+    with ThreadPoolExecutor(max_workers=min(16, len(files) or 1)) as executor:
+        return pa.Table.from_pylist(list(chain.from_iterable(executor.map(load_department, files))))
+
+
+def _normalize_course_number(course_number: str) -> str:
+    """Strip spaces and uppercase a course number so "POL 10100" matches "pol10100"."""
+    return course_number.replace(" ", "").upper()
+
+
+@st.cache_data(show_spinner=False)
+def _load_course_index_cached(mtime_ns: int) -> dict[str, dict]:
+    if not mtime_ns:
+        return {}
+    try:
+        index = orjson.loads(COURSE_INDEX_FILE.read_bytes())
+    except (OSError, orjson.JSONDecodeError):
+        return {}  # An unreadable index is rebuilt from the results files
+    return index if isinstance(index, dict) else {}
+
+
+def _course_index(files: list[Path]) -> dict[str, dict]:
+    """Return results file name -> {"mtime_ns", "courses"} for each department file.
+
+    The index is kept in COURSE_INDEX_FILE, and only files modified since their
+    entry was recorded are re-read to refresh it.
+    """
+    stored = _load_course_index_cached(_mtime_ns(COURSE_INDEX_FILE))
+    mtimes = {f.name: _mtime_ns(f) for f in files}
+    stale = [f for f in files if stored.get(f.name, {}).get("mtime_ns") != mtimes[f.name]]
+    if not stale and stored.keys() == mtimes.keys():
+        return stored
+
+    index = {name: stored[name] for name in mtimes if name in stored}
+    with ThreadPoolExecutor(max_workers=min(16, len(stale) or 1)) as executor:
+        for f, records in zip(stale, executor.map(load_department, stale)):
+            index[f.name] = {
+                "mtime_ns": mtimes[f.name],
+                "courses": sorted({
+                    _normalize_course_number(r["course_information"].get("course_number") or "")
+                    for r in records
+                }),
+            }
+
+    # Written atomically through a uniquely named temporary file, since several
+    # sessions may refresh the index at once
+    try:
+        with tempfile.NamedTemporaryFile(dir=DATA_DIR, prefix=COURSE_INDEX_FILE.name, delete=False) as tmp:
+            tmp.write(orjson.dumps(index))
+        try:
+            os.replace(tmp.name, COURSE_INDEX_FILE)
+        except OSError:
+            os.unlink(tmp.name)
+            raise
+    except OSError:
+        pass  # A read-only data directory only costs re-reading the files next session
+    return index
+
+
+def load_program_records(program_courses: list[str]) -> pa.Table:
+    """Load the results of only the departments that offer a program's courses.
+
+    The rubric sections are nested struct columns. The Parquet catalog written by
+    the analysis is used while it is newer than the results directory and every
+    department file and readable, since it holds every department in one read. Otherwise the course index picks out the department
+    files that contain any of the program's courses.
+    """
+    files = _result_files()
+    catalog_mtime = _mtime_ns(CATALOG_FILE)
+    if _newer_than_results(catalog_mtime, files):
+        try:
+            return _load_catalog_cached(catalog_mtime)
+        except (OSError, pa.ArrowInvalid):
+            pass  # A damaged catalog falls back to the department files
+    wanted = {_normalize_course_number(c) for c in program_courses}
+    index = _course_index(files)
+    return _load_records([f for f in files if not wanted.isdisjoint(index[f.name]["courses"])])
+
+
+@st.cache_data(show_spinner=False)
+def _get_programs_cached(mtime_ns: int) -> dict[str, list[str]]:
+    if not PROGRAMS_FILE.exists():
+        return {}
+    return orjson.loads(PROGRAMS_FILE.read_bytes())
+
+
+def get_programs() -> dict[str, list[str]]:
+    """Return a mapping of program name -> list of course numbers."""
+    return _get_programs_cached(_mtime_ns(PROGRAMS_FILE))
+
+
+def load_program_courses(program_courses: list[str], records: pa.Table) -> list[dict]:
+    """Filter the records table to a program's course list.
+
+    Only the course number column is read to build the match, and only matching
+    rows are converted back to dicts.
+    """
+    if records.num_rows == 0:
+        return []
+    normalized = pa.array({_normalize_course_number(c) for c in program_courses}, pa.string())
+    numbers = pc.struct_field(records["course_information"], "course_number").fill_null("")
+    mask = pc.is_in(pc.utf8_upper(pc.replace_substring(numbers, " ", "")), value_set=normalized)
+    return records.filter(mask).to_pylist()